@@ -1,68 +1,115 @@
 import os
 import json
+import asyncio
+import functools
+import logging
+import operator
+from collections import namedtuple
 from typing import TypedDict, Annotated, List, Dict, Any, Union
-from langgraph.graph import StateGraph, END
-from tools import firecrawl_toolset, google_search_tool, LlmAgent, run_with_retries
-from schemas import PageAuditOutput, SerpAnalysis
+from langgraph.graph import StateGraph, START, END
+from langgraph.types import Send
+from tools import firecrawl_toolset, google_search_tool, CachedLlmAgent, run_with_retries_async, dedupe_texts
+from schemas import PageAuditOutput, SerpAnalysis, KeywordGuess
+
+logger = logging.getLogger(__name__)
 
 # --- 1. State Definition ---
+def merge_dicts(left: Dict[str, Any], right: Dict[str, Any]) -> Dict[str, Any]:
+    """Reducer that merges parallel branch outputs (e.g. one SERP analysis per keyword)."""
+    return {**(left or {}), **(right or {})}
+
 class AgentState(TypedDict):
     url: str
     page_audit: Annotated[Dict[str, Any], "Merge page audit data"]
-    serp_analysis: Annotated[Dict[str, Any], "Merge serp analysis data"]
+    serp_analysis: Annotated[Dict[str, Any], merge_dicts]  # keyword -> SerpAnalysis
     report: Annotated[str, "Final report"]
-    errors: Annotated[List[str], "Accumulate errors"]
+    errors: Annotated[List[str], operator.add]
+    guessed_keyword: Annotated[str, "Fast URL-only keyword guess"]
+    speculative_serp: Annotated[Dict[str, Any], "SERP analysis for the guessed keyword"]
+
+class SerpTask(TypedDict):
+    """Payload sent to each parallel serp_analyst branch."""
+    keyword: str
+    page_audit: Dict[str, Any]
+
+# Upper bound on parallel SERP branches (primary + secondary keywords).
+MAX_SERP_KEYWORDS = int(os.getenv("SERP_MAX_KEYWORDS", "4"))
 
 # --- 2. Helper: Load Prompts ---
+@functools.lru_cache(maxsize=32)
 def load_prompt(name: str) -> str:
     try:
         path = os.path.join(os.path.dirname(__file__), "prompts", f"{name}.txt")
         with open(path, "r", encoding="utf-8") as f:
             return f.read()
     except Exception as e:
-        print(f"Error loading prompt {name}: {e}")
+        logger.error("Error loading prompt %s: %s", name, e)
         return ""
 
 # --- 3. Agent Instantiation ---
 # We initialize agents with prompts loaded from files.
 # Note: LlmAgent handles the LLM backend (Gemini/Groq) internally.
+# CachedLlmAgent memoizes outputs under memory/llm_cache/; only the SERP analyst
+# reuses answers for near-duplicate (paraphrased) keywords.
+# Agents are built on first use rather than at import, so importing this module
+# (e.g. on Streamlit's first paint) does no prompt I/O or client setup.
 
-page_auditor_agent = LlmAgent(
-    name="PageAuditorAgent",
-    model="gemini-1.5-flash",
-    description="Scrapes and audits the page.",
-    instruction=load_prompt("page_auditor"),
-    tools=[firecrawl_toolset],
-    output_schema=PageAuditOutput,
-    output_key="page_audit"
-)
-
-serp_analyst_agent = LlmAgent(
-    name="SerpAnalystAgent",
-    model="gemini-1.5-flash",
-    description="Analyzes SERP competitors.",
-    instruction=load_prompt("serp_analyst"),
-    tools=[google_search_tool],
-    output_schema=SerpAnalysis,
-    output_key="serp_analysis"
-)
-
-optimization_advisor_agent = LlmAgent(
-    name="OptimizationAdvisorAgent",
-    model="gemini-1.5-flash",
-    description="Generates the final report.",
-    instruction=load_prompt("optimization_advisor"),
-    tools=[], # Pure synthesis
-    output_key="report" # Returns string
-)
+Agents = namedtuple("Agents", ["page_auditor", "serp_analyst", "keyword_guesser", "optimization_advisor"])
+
+@functools.cache
+def get_agents() -> Agents:
+    return Agents(
+        page_auditor=CachedLlmAgent(
+            name="PageAuditorAgent",
+            model="gemini-1.5-flash",
+            description="Scrapes and audits the page.",
+            instruction=load_prompt("page_auditor"),
+            tools=[firecrawl_toolset],
+            output_schema=PageAuditOutput,
+            output_key="page_audit",
+            # The audit always starts by scraping the page itself
+            predict_tool_calls=lambda data: [("firecrawl_scrape", {"url": data["url"]})]
+        ),
+        serp_analyst=CachedLlmAgent(
+            name="SerpAnalystAgent",
+            model="gemini-1.5-flash",
+            description="Analyzes SERP competitors.",
+            instruction=load_prompt("serp_analyst"),
+            tools=[google_search_tool],
+            output_schema=SerpAnalysis,
+            output_key="serp_analysis",
+            semantic_key="keyword",
+            # ...and the SERP analysis by searching for its keyword
+            predict_tool_calls=lambda data: [("google_search", {"query": data["keyword"]})]
+        ),
+        keyword_guesser=CachedLlmAgent(
+            name="KeywordGuesserAgent",
+            model="gemini-1.5-flash-8b",
+            description="Guesses the primary keyword from the URL.",
+            instruction=load_prompt("keyword_guesser"),
+            tools=[], # URL only, no scraping
+            output_schema=KeywordGuess,
+            output_key="guess"
+        ),
+        optimization_advisor=CachedLlmAgent(
+            name="OptimizationAdvisorAgent",
+            model="gemini-1.5-flash",
+            description="Generates the final report.",
+            instruction=load_prompt("optimization_advisor"),
+            tools=[], # Pure synthesis
+            output_key="report" # Returns string
+        )
+    )
 
 # --- 4. Nodes (with Retries & Checkpoints) ---
+# Nodes are coroutines so LangGraph can overlap independent branches; agents
+# are awaited directly, so concurrent LLM calls share one event loop.
 
-def page_auditor_node(state: AgentState):
-    print("\n--- [Node] Page Auditor ---")
+async def page_auditor_node(state: AgentState):
+    logger.info("node=%s url=%s", "page_auditor", state["url"])
     try:
         # Run with retries
-        result = run_with_retries(page_auditor_agent.run, {"url": state["url"]})
+        result = await run_with_retries_async(get_agents().page_auditor.arun, {"url": state["url"]})
         
         # Checkpoint / Validation is handled by LlmAgent's output_schema (Pydantic)
         # If it returns a dict with "error", we handle it.
@@ -73,36 +120,131 @@ def page_auditor_node(state: AgentState):
     except Exception as e:
         return {"errors": [f"PageAuditor Exception: {str(e)}"]}
 
-def serp_analyst_node(state: AgentState):
-    print("\n--- [Node] SERP Analyst ---")
-    # Conditional Logic: Check if we have a primary keyword
+# Speculation: while the page audit runs, a cheap model guesses the primary
+# keyword from the URL and the SERP analysis for that guess starts right away.
+
+async def fast_keyword_guess(url: str) -> str:
+    """Returns the guessed primary keyword, or "" if the guess failed."""
+    try:
+        result = await run_with_retries_async(get_agents().keyword_guesser.arun, {"url": url})
+        if "error" in result:
+            logger.warning("Keyword guess failed: %s", result["error"])
+            return ""
+        return result["guess"]["guessed_keyword"]
+    except Exception as e:
+        logger.warning("Keyword guess failed: %s", e)
+        return ""
+
+async def serp_analyst_speculative(keyword: str, url: str) -> Dict[str, Any]:
+    """Runs the SERP analyst for the guessed keyword; returns {} on failure."""
+    try:
+        result = await run_with_retries_async(get_agents().serp_analyst.arun, {"keyword": keyword, "url": url})
+        if "error" in result:
+            return {}
+        return result["serp_analysis"]
+    except Exception as e:
+        logger.warning("Speculative SERP analysis failed: %s", e)
+        return {}
+
+async def speculative_serp_node(state: AgentState):
+    # Guess and speculative SERP share one node so the whole chain runs in the
+    # same superstep as page_auditor. Speculation is best-effort: on any failure
+    # the regular SERP fan-out still covers the primary keyword.
+    logger.info("node=%s url=%s", "keyword_guesser", state["url"])
+    keyword = await fast_keyword_guess(state["url"])
+    if not keyword:
+        return {}
+
+    logger.info("node=%s keyword=%s", "serp_analyst_speculative", keyword)
+    update = {"guessed_keyword": keyword}
+    analysis = await serp_analyst_speculative(keyword, state["url"])
+    if analysis:
+        update["speculative_serp"] = analysis
+    return update
+
+def normalize_keyword(keyword: str) -> str:
+    return " ".join((keyword or "").lower().split())
+
+def reconcile_serp_node(state: AgentState):
+    """Adopts the speculative SERP result if the guess matches the audited primary keyword."""
+    primary_keyword = state.get("page_audit", {}).get("target_keywords", {}).get("primary_keyword")
+    guessed_keyword = state.get("guessed_keyword")
+    if primary_keyword and state.get("speculative_serp") and normalize_keyword(primary_keyword) == normalize_keyword(guessed_keyword):
+        logger.info("Speculation: guess %r matched; reusing its SERP analysis", guessed_keyword)
+        return {"serp_analysis": {primary_keyword: state["speculative_serp"]}}
+    if guessed_keyword:
+        logger.info("Speculation: guess %r did not match %r", guessed_keyword, primary_keyword)
+    return {}
+
+def serp_keywords(audit_data: Dict[str, Any]) -> List[str]:
+    """Primary keyword first, then unique secondary keywords, capped at MAX_SERP_KEYWORDS."""
+    target = audit_data.get("target_keywords", {})
+    keywords = []
+    for keyword in [target.get("primary_keyword")] + list(target.get("secondary_keywords", [])):
+        if keyword and keyword not in keywords:
+            keywords.append(keyword)
+    return keywords[:MAX_SERP_KEYWORDS]
+
+def parallel_serp(state: AgentState):
+    """Fans out one serp_analyst branch per keyword via LangGraph's Send API."""
     audit_data = state.get("page_audit", {})
-    primary_keyword = audit_data.get("target_keywords", {}).get("primary_keyword")
-    
-    if not primary_keyword:
-        print("  [Warning] No primary keyword found. Skipping SERP analysis.")
-        return {"serp_analysis": {"error": "No primary keyword found"}}
 
+    # Short-circuit: without a page audit the SERP analysis and the report
+    # have nothing to work with, so don't pay for those LLM calls.
+    if state.get("errors") and not audit_data:
+        logger.error("Page audit failed; ending the workflow early")
+        return END
+    keywords = serp_keywords(audit_data)
+
+    # Conditional Logic: Check if we have a primary keyword
+    if not keywords:
+        logger.warning("No primary keyword found; skipping SERP analysis")
+        return "optimization_advisor"
+
+    # Keywords already answered (by the speculative branch) are not re-run.
+    done = state.get("serp_analysis", {})
+    pending = [k for k in keywords if k not in done]
+    if not pending:
+        return "optimization_advisor"
+
+    return [Send("serp_analyst", {"keyword": k, "page_audit": audit_data}) for k in pending]
+
+async def serp_analyst_node(task: SerpTask):
+    keyword = task["keyword"]
+    logger.info("node=%s keyword=%s", "serp_analyst", keyword)
     try:
-        # Pass the whole audit state so the agent can see the keyword
-        result = run_with_retries(serp_analyst_agent.run, {"page_audit": audit_data})
+        # Pass the audit alongside the keyword so the agent can do the gap analysis
+        input_data = {"keyword": keyword, "page_audit": task["page_audit"]}
+        result = await run_with_retries_async(get_agents().serp_analyst.arun, input_data)
         
         if "error" in result:
-             return {"errors": [f"SerpAnalyst Error: {result['error']}"]}
+             return {"errors": [f"SerpAnalyst Error ({keyword}): {result['error']}"]}
              
-        return result # Returns {"serp_analysis": ...}
+        return {"serp_analysis": {keyword: result["serp_analysis"]}}
     except Exception as e:
-        return {"errors": [f"SerpAnalyst Exception: {str(e)}"]}
+        return {"errors": [f"SerpAnalyst Exception ({keyword}): {str(e)}"]}
+
+def serp_overview(serp_analysis: Dict[str, Any]) -> Dict[str, List[str]]:
+    """Pools questions and themes across all keyword analyses, without near-duplicates."""
+    analyses = [a for a in (serp_analysis or {}).values() if isinstance(a, dict)]
+    return {
+        field: dedupe_texts([item for a in analyses for item in a.get(field) or []])
+        for field in ("people_also_ask", "key_themes")
+    }
 
-def optimization_advisor_node(state: AgentState):
-    print("\n--- [Node] Optimization Advisor ---")
+async def optimization_advisor_node(state: AgentState):
+    logger.info("node=%s", "optimization_advisor")
     try:
         # Pass all accumulated state
+        page_audit = state.get("page_audit") or {}
         input_data = {
-            "page_audit": state.get("page_audit"),
-            "serp_analysis": state.get("serp_analysis")
+            "page_audit": page_audit,
+            # Explicit, since prompt JSON is key-sorted and can't carry keyword order
+            "primary_keyword": page_audit.get("target_keywords", {}).get("primary_keyword"),
+            "serp_analysis": state.get("serp_analysis"),
+            "serp_overview": await asyncio.to_thread(serp_overview, state.get("serp_analysis")),
         }
-        result = run_with_retries(optimization_advisor_agent.run, input_data)
+        result = await run_with_retries_async(get_agents().optimization_advisor.arun, input_data)
         
         if "error" in result:
             return {"errors": [f"Advisor Error: {result['error']}"]}
@@ -117,24 +259,27 @@ workflow = StateGraph(AgentState)
 
 # Add Nodes
 workflow.add_node("page_auditor", page_auditor_node)
+workflow.add_node("speculative_serp", speculative_serp_node)
+workflow.add_node("reconcile_serp", reconcile_serp_node)
 workflow.add_node("serp_analyst", serp_analyst_node)
 workflow.add_node("optimization_advisor", optimization_advisor_node)
 
 # Add Edges
-workflow.set_entry_point("page_auditor")
-
-# Conditional Routing: If Auditor fails, stop or go to end?
-# For now, we linearize but we could add a "router" node.
-# Let's keep it simple: Auditor -> Analyst -> Advisor
-# But if Auditor errors, maybe skip to Advisor (who will say "I have no data")?
-# Let's just flow through. The nodes handle missing data gracefully (Robustness).
+# The audit and the keyword guess + speculative SERP start together;
+# reconcile_serp waits for both before deciding what SERP work is left.
+workflow.add_edge(START, "page_auditor")
+workflow.add_edge(START, "speculative_serp")
+workflow.add_edge(["page_auditor", "speculative_serp"], "reconcile_serp")
 
-workflow.add_edge("page_auditor", "serp_analyst")
+# Fan-out: one SERP branch per remaining keyword, all running concurrently.
+# The serp_analysis reducer merges the branches before the advisor runs.
+# If the page audit failed, the run ends here.
+workflow.add_conditional_edges("reconcile_serp", parallel_serp, ["serp_analyst", "optimization_advisor", END])
 workflow.add_edge("serp_analyst", "optimization_advisor")
 workflow.add_edge("optimization_advisor", END)
 
 # Compile
 app = workflow.compile()
 
-# Expose for main.py
+# Expose for main.py (async nodes: use ainvoke/astream)
 seo_audit_graph = app
\ No newline at end of file
@@ -2,11 +2,25 @@ import streamlit as st
 import os
 from dotenv import load_dotenv
 import time
-from agents import seo_audit_graph
+import asyncio
+import diskcache
 
-# Load environment variables
+# Load environment variables before importing agents; tools.py and agents.py read their knobs at import
 load_dotenv()
 
+# The graph is compiled once, at import of agents (modules survive Streamlit reruns)
+from agents import seo_audit_graph
+from tools import canonicalize, configure_logging
+
+@st.cache_resource
+def _init_env():
+    """One-time process setup; Streamlit reruns the script on every interaction."""
+    # Agent/node progress is logged at INFO; set LOG_LEVEL=INFO in .env to see it.
+    configure_logging(os.getenv("LOG_LEVEL", "WARNING"))
+    return True
+
+_init_env()
+
 # --- Page Configuration ---
 st.set_page_config(
     page_title="SEO Auditor AI",
@@ -116,86 +130,152 @@ with col2:
     analyze_btn = st.button("🚀 Run SEO Audit")
 
 # --- Logic & Display ---
-if analyze_btn and url_input:
-    if not url_input.startswith("http"):
-        st.error("Please enter a valid URL starting with http:// or https://")
+NODE_LABELS = {
+    "page_auditor": "Page Auditor",
+    "speculative_serp": "Keyword Guess (speculative SERP)",
+    "serp_analyst": "SERP Analyst",
+    "optimization_advisor": "Optimization Advisor",
+}
+
+# The last completed audit survives reruns (e.g. clicking the download button).
+if "audit" not in st.session_state:
+    st.session_state.audit = None
+
+async def stream_audit(initial_state, report_preview=None):
+    """
+    Streams the graph, reporting each node as soon as it finishes.
+    If a report_preview placeholder is given, the Optimization Advisor's
+    markdown is rendered into it token by token while it is generated.
+    Returns the final aggregated state (the last "values" chunk).
+    """
+    final_state = initial_state
+    report_buffer = ""
+    async for mode, chunk in seo_audit_graph.astream(initial_state, stream_mode=["updates", "values", "messages"]):
+        if mode == "values":
+            final_state = chunk
+            continue
+
+        if mode == "messages":
+            message, metadata = chunk
+            if report_preview is not None and metadata.get("langgraph_node") == "optimization_advisor" and message.text:
+                report_buffer += message.text
+                report_preview.markdown(report_buffer)
+            continue
+
+        for node, update in chunk.items():
+            if node not in NODE_LABELS:
+                continue  # internal bookkeeping nodes (e.g. reconcile_serp)
+            label = NODE_LABELS[node]
+            update = update or {}
+            if node == "serp_analyst" and update.get("serp_analysis"):
+                label = f"{label} ({', '.join(update['serp_analysis'])})"
+            if update.get("errors"):
+                st.write(f"⚠️ {label}: Failed")
+            else:
+                st.write(f"✅ {label}: Complete")
+    return final_state
+
+AUDIT_CACHE_TTL = 3600  # seconds
+
+@st.cache_resource
+def get_audit_cache():
+    """
+    Finished audits, shared by all sessions and kept for AUDIT_CACHE_TTL.
+    A plain store rather than st.cache_data: cached functions record every
+    element they write for replay, which breaks the live report preview.
+    """
+    return diskcache.Cache(os.path.join(os.path.dirname(__file__), "memory", "audit_cache"))
+
+@st.fragment
+def run_audit(url: str):
+    audit_cache = get_audit_cache()
+    cache_key = canonicalize(url)
+
+    # Status Indicator, with a live preview of the report below it
+    status = st.status("🤖 Agents are working...", expanded=True)
+    report_preview = st.empty()
+    with status:
+        final_state = audit_cache.get(cache_key)
+        if final_state is not None:
+            st.write("♻️ Reusing the audit of this page from the last hour.")
+        else:
+            st.write("🔍 Page Auditor: Scanning website content...")
+            
+            # Initial State
+            initial_state = {
+                "url": url, 
+                "page_audit": {}, 
+                "serp_analysis": {}, 
+                "report": "", 
+                "errors": []
+            }
+            
+            # Run the Graph, pushing progress into the status container per node
+            final_state = asyncio.run(stream_audit(initial_state, report_preview))
+            # Don't keep failed audits around; the next click should retry them.
+            if not final_state.get("errors"):
+                audit_cache.set(cache_key, final_state, expire=AUDIT_CACHE_TTL)
+        st.session_state.audit = final_state
+        status.update(label="Audit Completed!", state="complete", expanded=False)
+    # The finished report is rendered by render_results; drop the live preview.
+    report_preview.empty()
+
+def render_results(final_state):
+    # --- Display Results ---
+    
+    # 1. Main Report
+    if final_state.get("report"):
+        st.markdown("<div class='result-card'>", unsafe_allow_html=True)
+        st.markdown("## 📋 Comprehensive SEO Report")
+        st.markdown(final_state["report"])
+        st.markdown("</div>", unsafe_allow_html=True)
+        
+        # Download Button
+        st.download_button(
+            label="📥 Download Report",
+            data=final_state["report"],
+            file_name="seo_audit_report.md",
+            mime="text/markdown"
+        )
     else:
-        # Container for results
-        result_container = st.container()
+        st.warning("No report was generated. Please check the errors below.")
+
+    # 2. Errors (if any)
+    if final_state.get("errors"):
+        st.error("Errors encountered during audit:")
+        for err in final_state["errors"]:
+            st.write(f"- {err}")
+
+    # 3. Detailed Data (Expanders)
+    st.markdown("### 🔍 Detailed Analysis Data")
+    
+    with st.expander("📄 Raw Page Audit Data"):
+        st.json(final_state.get("page_audit", {}))
         
-        with result_container:
-            try:
-                # Status Indicator
-                with st.status("🤖 Agents are working...", expanded=True) as status:
-                    st.write("🔍 Page Auditor: Scanning website content...")
-                    
-                    # Initial State
-                    initial_state = {
-                        "url": url_input, 
-                        "page_audit": {}, 
-                        "serp_analysis": {}, 
-                        "report": "", 
-                        "errors": []
-                    }
-                    
-                    # Run the Graph
-                    # We can't easily stream updates from the graph unless we use a callback or stream() 
-                    # but for now we'll just run it and simulate progress or just wait.
-                    # Ideally, we'd use .stream() to get updates, but let's stick to .invoke() for stability as per main.py
-                    
-                    final_state = seo_audit_graph.invoke(initial_state)
-                    
-                    # Check progress based on state (simulated since invoke is blocking)
-                    if final_state.get("page_audit"):
-                        st.write("✅ Page Auditor: Complete")
-                        st.write("📊 SERP Analyst: Analyzing competitors...")
-                    
-                    if final_state.get("serp_analysis"):
-                        st.write("✅ SERP Analyst: Complete")
-                        st.write("💡 Optimization Advisor: Generating report...")
-                        
-                    status.update(label="Audit Completed!", state="complete", expanded=False)
-
-                # --- Display Results ---
-                
-                # 1. Main Report
-                if final_state.get("report"):
-                    st.markdown("<div class='result-card'>", unsafe_allow_html=True)
-                    st.markdown("## 📋 Comprehensive SEO Report")
-                    st.markdown(final_state["report"])
-                    st.markdown("</div>", unsafe_allow_html=True)
-                    
-                    # Download Button
-                    st.download_button(
-                        label="📥 Download Report",
-                        data=final_state["report"],
-                        file_name="seo_audit_report.md",
-                        mime="text/markdown"
-                    )
-                else:
-                    st.warning("No report was generated. Please check the errors below.")
-
-                # 2. Errors (if any)
-                if final_state.get("errors"):
-                    st.error("Errors encountered during audit:")
-                    for err in final_state["errors"]:
-                        st.write(f"- {err}")
-
-                # 3. Detailed Data (Expanders)
-                st.markdown("### 🔍 Detailed Analysis Data")
-                
-                with st.expander("📄 Raw Page Audit Data"):
-                    st.json(final_state.get("page_audit", {}))
-                    
-                with st.expander("🏆 SERP Competitor Analysis"):
-                    st.json(final_state.get("serp_analysis", {}))
+    with st.expander("🏆 SERP Competitor Analysis"):
+        st.json(final_state.get("serp_analysis", {}))
 
+# Container for results
+result_container = st.container()
+
+with result_container:
+    if analyze_btn and url_input:
+        url_input = url_input.strip()
+        if not url_input.startswith("http"):
+            st.error("Please enter a valid URL starting with http:// or https://")
+        else:
+            try:
+                run_audit(url_input)
             except Exception as e:
+                st.session_state.audit = None
                 st.error(f"An unexpected error occurred: {e}")
                 # Optional: Print traceback to console for debugging
                 import traceback
                 traceback.print_exc()
 
+    if st.session_state.audit:
+        render_results(st.session_state.audit)
+
 # --- Footer ---
 st.markdown(
     """
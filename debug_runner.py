@@ -1,14 +1,32 @@
+import os
 import sys
 import traceback
 
-try:
-    print("Attempting to import main...")
-    import main
-    print("Main imported. Running main...")
-    main.target_url = "https://www.example.com"
-    main.main(main.target_url)
-    print("Main finished.")
-except Exception:
-    print("Exception occurred!")
-    with open("error.log", "w") as f:
-        traceback.print_exc(file=f)
+from watchfiles import run_process
+
+# Files that trigger a re-run when they change, resolved next to this script
+# so the runner works from any working directory
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+WATCH_PATHS = [os.path.join(PROJECT_DIR, name) for name in ("agents.py", "tools.py", "schemas.py", "main.py", "prompts")]
+
+
+def run_once(target_url: str):
+    """Runs a single audit; executed in a fresh child process on every change."""
+    try:
+        print("Attempting to import main...")
+        import main
+        print("Main imported. Running main...")
+        main.main(target_url)
+        print("Main finished.")
+    except Exception:
+        print("Exception occurred!")
+        with open(os.path.join(PROJECT_DIR, "error.log"), "w") as f:
+            traceback.print_exc(file=f)
+
+
+if __name__ == "__main__":
+    target_url = sys.argv[1] if len(sys.argv) > 1 else "https://www.example.com"
+
+    # Runs once immediately, then again whenever a watched file is saved.
+    # Ctrl+C to stop.
+    run_process(*WATCH_PATHS, target=run_once, args=(target_url,))
@@ -1,12 +1,31 @@
 from dotenv import load_dotenv
 import os
 import json
+import asyncio
 
 # Load environment variables before importing agents
 load_dotenv()
 
 from agents import seo_audit_graph
-from tools import load_memory, save_memory
+from tools import load_memory, append_memory, start_memory_run, configure_logging
+
+# Agent/node progress is logged at INFO; set LOG_LEVEL=INFO in .env to see it.
+configure_logging(os.getenv("LOG_LEVEL", "WARNING"))
+
+async def run_graph(initial_state: dict) -> dict:
+    """
+    Runs the graph to completion, persisting each step as it lands: only the
+    state keys that changed are appended to the memory log, after a run-start
+    marker that hides whatever earlier runs recorded.
+    """
+    start_memory_run()
+    final_state = {}
+    async for state in seo_audit_graph.astream(initial_state, stream_mode="values"):
+        for key, value in state.items():
+            if final_state.get(key) != value:
+                append_memory(key, value)
+        final_state = state
+    return final_state
 
 def main(url: str):
     """
@@ -30,9 +49,8 @@ def main(url: str):
     try:
         print("🚀 Initializing LangGraph Workflow...")
         
-        # Run the graph
-        # .invoke() runs the graph to completion
-        final_state = seo_audit_graph.invoke(initial_state)
+        # Run the graph; the SERP branches run concurrently
+        final_state = asyncio.run(run_graph(initial_state))
         
         print("\n✅ Workflow Completed.")
         
@@ -50,10 +68,7 @@ def main(url: str):
                 for err in final_state["errors"]:
                     print(f"- {err}")
 
-        # Save Memory (Persistence)
-        # We save the final state so we can inspect it later or resume
-        save_memory(final_state)
-        print(f"\n💾 State saved to memory/state.json")
+        print(f"\n💾 State saved to memory/state.jsonl")
             
     except Exception as e:
         print(f"❌ An error occurred during the audit: {e}")
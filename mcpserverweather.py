@@ -1,6 +1,31 @@
-fimport os
-import requests
-from langchain_core.tools import tool
+import os
+import httpx
+import cachetools.func
+from fastmcp import FastMCP
+
+mcp = FastMCP("weather")
+
+# One pooled HTTP/2 client for the whole server: repeat calls reuse the TCP+TLS connection.
+_client = httpx.Client(http2=True, timeout=5.0)
+
+
+@cachetools.func.ttl_cache(maxsize=512, ttl=300)
+def _fetch_weather(location: str) -> dict:
+    """
+    Fetches the raw OpenWeatherMap payload for a location.
+
+    Results are cached for 5 minutes (OpenWeather refreshes roughly every 10).
+    Failures raise instead of returning, so errors are never cached.
+    """
+    base_url = "https://api.openweathermap.org/data/2.5/weather"
+    params = {
+        "q": location,
+        "appid": os.getenv("OPENWEATHER_API_KEY"),
+        "units": "metric"  # Use 'imperial' for Fahrenheit
+    }
+    response = _client.get(base_url, params=params)
+    response.raise_for_status()  # Raises an exception for bad status codes (4xx or 5xx)
+    return response.json()
 
 
 @mcp.tool
@@ -20,17 +45,8 @@ def get_weather_data(location: str) -> str:
     if not api_key:
         return "Error: The OPENWEATHER_API_KEY environment variable is not set. Please set it to use this tool."
 
-    base_url = "http://api.openweathermap.org/data/2.5/weather"
-    params = {
-        "q": location,
-        "appid": api_key,
-        "units": "metric"  # Use 'imperial' for Fahrenheit
-    }
-
     try:
-        response = requests.get(base_url, params=params)
-        response.raise_for_status()  # Raises an exception for bad status codes (4xx or 5xx)
-        data = response.json()
+        data = _fetch_weather(location)
 
         if data.get("cod") != 200:
             return f"Error: Could not retrieve weather for {location}. Reason: {data.get('message', 'Unknown error')}"
@@ -38,5 +54,9 @@ def get_weather_data(location: str) -> str:
         weather_desc = data["weather"][0]["description"]
         temp = data["main"]["temp"]
         return f"The current weather in {data['name']} is {weather_desc} with a temperature of {temp}°C."
-    except requests.exceptions.RequestException as e:
-        return f"Error: Failed to connect to the weather service. Details: {e}"
\ No newline at end of file
+    except httpx.HTTPError as e:
+        return f"Error: Failed to connect to the weather service. Details: {e}"
+
+
+if __name__ == "__main__":
+    mcp.run()
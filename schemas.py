@@ -1,5 +1,6 @@
-from pydantic import BaseModel, Field
-from typing import List, Optional
+from functools import lru_cache
+from pydantic import BaseModel, Field, TypeAdapter
+from typing import List, Optional, Type
 
 
 class HeadingItem(BaseModel):
@@ -65,6 +66,12 @@ class PageAuditOutput(BaseModel):
     )
 
 
+class KeywordGuess(BaseModel):
+    guessed_keyword: str = Field(
+        ..., description="Probable primary keyword inferred from the URL alone."
+    )
+
+
 class SerpResult(BaseModel):
     rank: int = Field(..., description="Organic ranking position.")
     title: str = Field(..., description="Title of the search result.")
@@ -108,4 +115,17 @@ class OptimizationRecommendation(BaseModel):
     recommendation: str = Field(..., description="Recommended action.")
     rationale: str = Field(..., description="Why this change matters, referencing audit/SERP data.")
     expected_impact: str = Field(..., description="Anticipated impact on SEO or user metrics.")
-    effort: str = Field(..., description="Relative effort required (low/medium/high).")
\ No newline at end of file
+    effort: str = Field(..., description="Relative effort required (low/medium/high).")
+
+
+# --- Precompiled validators ---
+# Building a TypeAdapter compiles the validator once; reuse it for every LLM response.
+
+@lru_cache(maxsize=None)
+def type_adapter(model: Type[BaseModel]) -> TypeAdapter:
+    """Returns the shared TypeAdapter for a schema, compiling it on first use."""
+    return TypeAdapter(model)
+
+
+PAGE_AUDIT_ADAPTER = type_adapter(PageAuditOutput)
+SERP_ADAPTER = type_adapter(SerpAnalysis)
\ No newline at end of file
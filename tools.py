@@ -1,115 +1,494 @@
 import os
-import json
-import traceback
-from typing import List, Dict, Any, Optional, Type, Callable
+import asyncio
+import atexit
+import contextlib
+import functools
+import httpx
+import logging
+import logging.handlers
+import mmap
+import queue
+import sqlite3
+import threading
+import time
+import cachetools
+import numpy as np
+import diskcache
+import orjson
+import xxhash
+from typing import List, Dict, Any, Optional, Tuple, Type, Callable, Awaitable
+from importlib.util import find_spec
+from urllib.parse import parse_qs, urlsplit, urlunsplit
 from pydantic import BaseModel
 from tenacity import retry, stop_after_attempt, wait_exponential, retry_if_exception_type
+from schemas import type_adapter
 
 # LangChain Imports
-#
-import google.generativeai as genai
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain_core.messages import SystemMessage, HumanMessage, ToolMessage
+from langchain_core.exceptions import ModelAPIError, ModelConnectionError, ModelRateLimitError, ModelTimeoutError
+from langchain_core.messages import AIMessageChunk, SystemMessage, HumanMessage, ToolMessage
 from langchain_core.tools import tool as tool_decorator
-from langchain_core.utils.function_calling import convert_to_openai_tool
 
 # Search Tools
-from duckduckgo_search import DDGS
+import aiohttp
+from selectolax.lexbor import LexborHTMLParser
+
+logger = logging.getLogger(__name__)
+
+# --- 0. Cache Keys ---
+
+def hash_key(payload: Any) -> str:
+    """
+    Cache key for a JSON-like payload: 128-bit xxh3 over a sorted-key orjson
+    serialization. Keys only need to be stable and collision-resistant, not
+    cryptographic.
+    """
+    return xxhash.xxh3_128_hexdigest(orjson.dumps(payload, option=orjson.OPT_SORT_KEYS))
+
+def canonicalize(url: str) -> str:
+    """
+    Collapses spellings of the same page to one cache key: scheme/host case,
+    a leading "www.", a trailing slash, utm_* tracking parameters, query parameter
+    order and the fragment. The path keeps its case since servers may treat it as
+    case-sensitive.
+    """
+    s = urlsplit(url.strip())
+    netloc = s.netloc.lower().removeprefix("www.")
+    query = "&".join(sorted(p for p in s.query.split("&") if p and not p.startswith("utm_")))
+    return urlunsplit((s.scheme.lower(), netloc, s.path.rstrip("/") or "/", query, ""))
+
 
 # --- 1. Tool Definitions ---
 
+# One pooled aiohttp session for the whole process. A session is bound to the loop
+# that created it, while main.py/app.py start a fresh loop per audit via asyncio.run(),
+# so the session lives on its own background loop and callers hop onto it.
+_http_loop: Optional[asyncio.AbstractEventLoop] = None
+_SESSION: Optional[aiohttp.ClientSession] = None
+_http_lock = threading.Lock()
+
+def _get_http_loop() -> asyncio.AbstractEventLoop:
+    global _http_loop
+    with _http_lock:
+        if _http_loop is None:
+            _http_loop = asyncio.new_event_loop()
+            threading.Thread(target=_http_loop.run_forever, name="http-session", daemon=True).start()
+    return _http_loop
+
+def _get_session() -> aiohttp.ClientSession:
+    """Creates the keep-alive session on first use; must be called on the HTTP loop."""
+    global _SESSION
+    if _SESSION is None:
+        _SESSION = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=32, keepalive_timeout=60),
+            timeout=aiohttp.ClientTimeout(total=30),
+            headers={"User-Agent": "Mozilla/5.0 (compatible; SEO-Auditor/1.0)"},
+            json_serialize=lambda obj: orjson.dumps(obj).decode(),
+        )
+    return _SESSION
+
+async def _fetch_text(method: str, url: str, **kwargs) -> str:
+    async with _get_session().request(method, url, **kwargs) as response:
+        response.raise_for_status()
+        return await response.text()
+
+async def on_http_loop(coro: Awaitable) -> Any:
+    """Awaits a coroutine on the shared session's loop from any event loop."""
+    return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(coro, _get_http_loop()))
+
+_in_flight: Dict[str, Any] = {}  # key -> concurrent.futures.Future
+_in_flight_lock = threading.RLock()
+
+def _forget_in_flight(key: str, future) -> None:
+    with _in_flight_lock:
+        if _in_flight.get(key) is future:
+            del _in_flight[key]
+
+async def coalesced(key: str, make_coro: Callable[[], Awaitable[Any]]) -> Any:
+    """
+    Runs make_coro() at most once per key at a time: concurrent callers with the same
+    key, from any event loop, await the same run. The run lives on the HTTP loop and is
+    shielded from its callers, so it still finishes (and fills the caches) if they are cancelled.
+    """
+    with _in_flight_lock:
+        future = _in_flight.get(key)
+        if future is None:
+            future = asyncio.run_coroutine_threadsafe(make_coro(), _get_http_loop())
+            _in_flight[key] = future
+            future.add_done_callback(functools.partial(_forget_in_flight, key))
+    return await asyncio.shield(asyncio.wrap_future(future))
+
+async def http_text(method: str, url: str, **kwargs) -> str:
+    """Performs a request on the shared session from any event loop and returns the body."""
+    return await on_http_loop(_fetch_text(method, url, **kwargs))
+
+@atexit.register
+def _close_session():
+    if _SESSION is not None and not _SESSION.closed:
+        try:
+            asyncio.run_coroutine_threadsafe(_SESSION.close(), _http_loop).result(timeout=5)
+        except Exception:
+            pass
+
+
+DDG_HTML_URL = "https://html.duckduckgo.com/html/"
+
 class GoogleSearch:
     """
-    Google Search tool using DuckDuckGo as a backend.
+    Google Search tool using DuckDuckGo's HTML endpoint as a backend.
     """
-    def __init__(self):
-        self.ddgs = DDGS()
+    def __init__(self, max_results: int = 10):
+        self.max_results = max_results
 
-    def search(self, query: str) -> List[Dict[str, str]]:
+    async def asearch(self, query: str) -> List[Dict[str, str]]:
         """
         Performs a search and returns a list of results.
         """
-        print(f"  [Search] Searching for: {query}")
+        logger.info("Searching for: %s", query)
         results = []
         try:
-            # ddgs.text returns a generator, so we listify it
-            search_results = list(self.ddgs.text(query, max_results=10))
-            for result in search_results:
-                results.append({
-                    "title": result.get("title", ""),
-                    "url": result.get("href", ""),
-                    "snippet": result.get("body", "")
-                })
+            html = await http_text("GET", DDG_HTML_URL, params={"q": query})
+            results = self._parse(html)
         except Exception as e:
-            print(f"  [Search Error] {e}")
+            logger.warning("Search failed for %r: %s", query, e)
+        return results
+
+    def _parse(self, html: str) -> List[Dict[str, str]]:
+        results = []
+        for node in LexborHTMLParser(html).css("div.result"):
+            if "result--ad" in (node.attributes.get("class") or ""):
+                continue
+            link = node.css_first("a.result__a")
+            if link is None:
+                continue
+            snippet = node.css_first(".result__snippet")
+            results.append({
+                "title": link.text(separator=" ", strip=True),
+                "url": self._resolve(link.attributes.get("href") or ""),
+                "snippet": snippet.text(separator=" ", strip=True) if snippet is not None else ""
+            })
+            if len(results) >= self.max_results:
+                break
         return results
 
+    @staticmethod
+    def _resolve(href: str) -> str:
+        """Unwraps DuckDuckGo's /l/?uddg=<target> redirect links."""
+        target = parse_qs(urlsplit(href).query).get("uddg")
+        return target[0] if target else href
+
 google_search_instance = GoogleSearch()
 
-# We wrap this as a standalone function for LangChain to bind easily
-def google_search(query: str) -> str:
+# SERP branches for overlapping keywords often repeat a query within one audit; results
+# are kept briefly, in memory and on disk so other processes (Streamlit, CLI) share them.
+SEARCH_CACHE_DIR = os.path.join(os.path.dirname(__file__), "memory", "search_cache")
+SEARCH_CACHE_TTL = 600  # seconds
+
+_search_cache = None
+_recent_searches = cachetools.TTLCache(maxsize=256, ttl=SEARCH_CACHE_TTL)
+_recent_searches_lock = threading.Lock()
+
+def _get_search_cache() -> diskcache.Cache:
+    global _search_cache
+    if _search_cache is None:
+        _search_cache = diskcache.Cache(SEARCH_CACHE_DIR)
+    return _search_cache
+
+# We wrap this as a standalone function for LangChain to bind easily.
+# Being a coroutine, the tool runs on the agent's event loop via ainvoke.
+async def google_search(query: str) -> str:
     """
     Performs a web search for the given query and returns the top results as a JSON string.
     """
-    results = google_search_instance.search(query)
-    return json.dumps(results)
+    normalized = " ".join(query.split()).casefold()
+    key = hash_key({"query": normalized, "max_results": google_search_instance.max_results})
+    with _recent_searches_lock:
+        cached = _recent_searches.get(key)
+    if cached is None:
+        cached = _get_search_cache().get(key)
+    if cached is not None:
+        logger.info("Search cache hit for: %s", query)
+        with _recent_searches_lock:
+            _recent_searches[key] = cached
+        return cached
+
+    async def search_and_store() -> str:
+        results = await google_search_instance.asearch(query)
+        serialized = orjson.dumps(results).decode()
+        # An empty list usually means the request failed; don't pin it
+        if results:
+            _get_search_cache().set(key, serialized, expire=SEARCH_CACHE_TTL)
+            with _recent_searches_lock:
+                _recent_searches[key] = serialized
+        return serialized
+
+    # Equivalent queries already in flight (e.g. a prefetch) share one request
+    return await coalesced(key, search_and_store)
 
 
 # Firecrawl Tool
-# Re-implementing firecrawl_toolset to use the direct library if available, or mock.
-try:
-    from firecrawl import FirecrawlApp
-    
-    class FirecrawlTool:
-        def __init__(self):
-            self.app = FirecrawlApp(api_key=os.getenv("FIRECRAWL_API_KEY"))
-
-        def scrape(self, url: str) -> str:
-            """
-            Scrapes the provided URL to extract markdown content.
-            """
-            print(f"  [Firecrawl] Scraping {url}...")
-            try:
-                params = {
-                    "formats": ["markdown", "html"],
-                    "onlyMainContent": True,
-                    "timeout": 90000
-                }
-                scrape_result = self.app.scrape_url(url, params=params)
-                return json.dumps(scrape_result)
-            except Exception as e:
-                print(f"  [Firecrawl Error] {e}")
-                return json.dumps({"error": str(e)})
-
-    firecrawl_instance = None
-    
-    def firecrawl_scrape(url: str) -> str:
-        """
-        Scrapes a website URL and returns the content in markdown format.
-        """
-        global firecrawl_instance
-        if firecrawl_instance is None:
-             firecrawl_instance = FirecrawlTool()
-        return firecrawl_instance.scrape(url)
+# Calls the Firecrawl REST API directly over the shared session.
+
+FIRECRAWL_SCRAPE_OPTIONS = {
+    "formats": ["markdown", "html"],
+    "onlyMainContent": True,
+    "timeout": 90000,
+    # Let Firecrawl serve its own copy if it scraped the page within the last hour
+    "maxAge": 3_600_000
+}
+FIRECRAWL_CACHE_DIR = os.path.join(os.path.dirname(__file__), "memory", "firecrawl_cache")
+FIRECRAWL_CACHE_TTL = 24 * 3600  # seconds
 
-    firecrawl_toolset = firecrawl_scrape 
+_scrape_cache = None
+# Hot copies of recent scrapes, so overlapping SERP branches skip the disk read too
+_recent_scrapes = cachetools.TTLCache(maxsize=512, ttl=FIRECRAWL_CACHE_TTL)
+_recent_scrapes_lock = threading.Lock()
 
-except ImportError:
-    print("Warning: firecrawl-py not installed or failed to import.")
-    def firecrawl_toolset(url: str) -> str:
-        return json.dumps({"error": "Firecrawl library not available."})
+def _get_scrape_cache() -> diskcache.Cache:
+    """Opens the on-disk scrape cache on first use (1 GiB, least-recently-used eviction)."""
+    global _scrape_cache
+    if _scrape_cache is None:
+        _scrape_cache = diskcache.Cache(FIRECRAWL_CACHE_DIR, size_limit=2**30, eviction_policy="least-recently-used")
+    return _scrape_cache
+
+def cached_scrape(func: Callable[[str], Awaitable[str]]) -> Callable[[str], Awaitable[str]]:
+    """
+    Caches successful scrape results in memory and on disk for FIRECRAWL_CACHE_TTL.
+    The key is content-addressed on the canonical URL plus the scrape options, so
+    tracking-parameter variants share a row and changing the options never serves
+    a stale format. Concurrent scrapes of the same key are coalesced into one call.
+    """
+    @functools.wraps(func)
+    async def wrapper(url: str) -> str:
+        key = hash_key({"url": canonicalize(url), "options": FIRECRAWL_SCRAPE_OPTIONS})
+        with _recent_scrapes_lock:
+            cached = _recent_scrapes.get(key)
+        if cached is None:
+            cached = _get_scrape_cache().get(key)
+        if cached is not None:
+            logger.info("Scrape cache hit for %s", url)
+            with _recent_scrapes_lock:
+                _recent_scrapes[key] = cached
+            return cached
+
+        async def scrape_and_store() -> str:
+            result = await func(url)
+            if "error" not in orjson.loads(result):
+                _get_scrape_cache().set(key, result, expire=FIRECRAWL_CACHE_TTL)
+                with _recent_scrapes_lock:
+                    _recent_scrapes[key] = result
+            return result
+
+        # Variants of a URL already being scraped (e.g. a prefetch) share one billable call
+        return await coalesced(key, scrape_and_store)
+    return wrapper
+
+FIRECRAWL_API_URL = "https://api.firecrawl.dev/v1/scrape"
+# Scrapes in flight at once across all audits, to stay inside Firecrawl's rate limits
+FIRECRAWL_MAX_CONCURRENCY = 8
+_firecrawl_slots: Optional[asyncio.Semaphore] = None
+
+async def _post_scrape(url: str) -> Dict[str, Any]:
+    """Runs on the HTTP loop, so a single semaphore bounds every caller."""
+    global _firecrawl_slots
+    if _firecrawl_slots is None:
+        _firecrawl_slots = asyncio.Semaphore(FIRECRAWL_MAX_CONCURRENCY)
+    async with _firecrawl_slots:
+        body = await _fetch_text(
+            "POST", FIRECRAWL_API_URL,
+            json={"url": url, **FIRECRAWL_SCRAPE_OPTIONS},
+            headers={"Authorization": f"Bearer {os.getenv('FIRECRAWL_API_KEY')}"},
+            timeout=aiohttp.ClientTimeout(total=FIRECRAWL_SCRAPE_OPTIONS["timeout"] / 1000 + 10),
+        )
+    return orjson.loads(body)
+
+@cached_scrape
+async def firecrawl_scrape(url: str) -> str:
+    """
+    Scrapes a website URL and returns the content in markdown format.
+    """
+    logger.info("Scraping %s", url)
+    try:
+        if not os.getenv("FIRECRAWL_API_KEY"):
+            raise RuntimeError("FIRECRAWL_API_KEY not set.")
+        response = await on_http_loop(_post_scrape(url))
+        if not response.get("success"):
+            raise RuntimeError(response.get("error") or "Scrape failed.")
+        return orjson.dumps(response["data"]).decode()
+    except Exception as e:
+        logger.warning("Scrape failed for %s: %s", url, e)
+        return orjson.dumps({"error": str(e)}).decode()
+
+def firecrawl_scrape_sync(url: str) -> str:
+    """Blocking wrapper around firecrawl_scrape() for callers outside an event loop."""
+    return asyncio.run(firecrawl_scrape(url))
+
+firecrawl_toolset = firecrawl_scrape
 
 
 # --- 2. Unified LLM Agent (LangChain Powered) ---
 
+PROMPT_PREAMBLE = "Please process this input according to your instructions.\n\nInput Data: "
+
+LLM_HTTP_LIMITS = httpx.Limits(max_connections=50, max_keepalive_connections=20)
+
+
+async def _next_chunk(chunks) -> Optional[bytes]:
+    try:
+        return await chunks.__anext__()
+    except StopAsyncIteration:
+        return None
+
+class _HttpLoopByteStream(httpx.AsyncByteStream):
+    """Reads a response body that belongs to the HTTP loop from any event loop."""
+    def __init__(self, stream: httpx.AsyncByteStream):
+        self._stream = stream
+
+    async def __aiter__(self):
+        chunks = self._stream.__aiter__()
+        while (chunk := await on_http_loop(_next_chunk(chunks))) is not None:
+            yield chunk
+
+    async def aclose(self):
+        await on_http_loop(self._stream.aclose())
+
+class HttpLoopTransport(httpx.BaseTransport, httpx.AsyncBaseTransport):
+    """
+    HTTP/2 transport for the Gemini client. Async requests run on the shared HTTP
+    loop, so a single keep-alive pool serves every audit's event loop (asyncio.run()
+    per audit) instead of one pool per loop; response bodies still stream chunk by chunk.
+    Passing a transport also makes google-genai use httpx rather than its own
+    per-loop aiohttp sessions.
+    """
+    def __init__(self, limits: httpx.Limits = LLM_HTTP_LIMITS):
+        self._sync = httpx.HTTPTransport(http2=True, limits=limits)
+        # Only ever driven from the HTTP loop, which its connections stay bound to
+        self._async = httpx.AsyncHTTPTransport(http2=True, limits=limits)
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        return self._sync.handle_request(request)
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        response = await on_http_loop(self._async.handle_async_request(request))
+        return httpx.Response(
+            status_code=response.status_code,
+            headers=response.headers,
+            stream=_HttpLoopByteStream(response.stream),
+            extensions=response.extensions,
+        )
+
+    # The pools are shared by every client, so closing one client leaves them open;
+    # they live as long as the process.
+    def close(self):
+        pass
+
+    async def aclose(self):
+        pass
+
+# Connection pool shared by every Gemini client: HTTP/2 multiplexes the parallel
+# SERP branches over a few kept-alive connections instead of a TLS handshake each.
+LLM_HTTP_CLIENT_ARGS = {"transport": HttpLoopTransport()}
+
+@functools.lru_cache(maxsize=None)
+def get_llm(model: str, temperature: float = 0) -> "ChatGoogleGenerativeAI":
+    """
+    Returns the shared chat client for a model; agents on the same model reuse one
+    pool and only bind their own tools on top of it.
+    """
+    # Imported on first use: the Gemini SDK stack takes about a second to import,
+    # which Streamlit's first paint and tool-only callers shouldn't pay.
+    from langchain_google_genai import ChatGoogleGenerativeAI
+
+    llm = ChatGoogleGenerativeAI(
+        model=model,
+        google_api_key=os.getenv("GEMINI_API_KEY"),
+        temperature=temperature,
+        client_args=LLM_HTTP_CLIENT_ARGS,
+    )
+    # google-genai prefers its own per-loop aiohttp sessions unless it honours our
+    # transport; say so rather than silently losing the shared HTTP/2 pool.
+    api_client = getattr(llm.client, "_api_client", None)
+    if api_client is not None and getattr(api_client, "_use_aiohttp", lambda: False)():
+        logger.warning("google-genai ignored the custom transport; async Gemini calls use aiohttp")
+    return llm
+
+def dump_prompt_json(data: Any) -> str:
+    """Compact, key-sorted JSON for prompts."""
+    return orjson.dumps(data, option=orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS).decode()
+
+JSON_CLOSERS = {"{": "}", "[": "]"}
+
+def extract_json(text: str, opener: str = "{") -> str:
+    """
+    Slices out the outermost JSON value of the expected shape ("{" for an object,
+    "[" for an array), from the first `opener` to the last matching closer,
+    dropping markdown fences and any prose around it.
+    """
+    start = text.find(opener)
+    if start == -1:
+        return text.strip()
+    end = text.rfind(JSON_CLOSERS[opener])
+    return text[start:end + 1] if end > start else text[start:]
+
+class JsonEndScanner:
+    """
+    Incrementally tracks bracket depth over streamed text (ignoring brackets inside
+    strings) and reports every top-level span that opens with `opener`, as in
+    extract_json, and closes again. Bracketed prose such as "{result}" yields a span too,
+    so callers validate each candidate before trusting it.
+    """
+    def __init__(self, opener: str = "{"):
+        self.opener = opener
+        self.depth = 0
+        self.start: Optional[int] = None
+        self.in_string = False
+        self.escaped = False
+        self.offset = 0
+
+    def feed(self, text: str) -> List[Tuple[int, int]]:
+        """
+        Consumes the next chunk; returns the (start, end) offsets into the text fed so
+        far of each span closed in it, end exclusive.
+        """
+        spans = []
+        for i, ch in enumerate(text, self.offset):
+            if self.in_string:
+                if self.escaped:
+                    self.escaped = False
+                elif ch == "\\":
+                    self.escaped = True
+                elif ch == '"':
+                    self.in_string = False
+            elif ch == '"':
+                self.in_string = self.start is not None
+            elif ch == self.opener or (ch in JSON_CLOSERS and self.start is not None):
+                if self.start is None:
+                    self.start = i
+                self.depth += 1
+            elif ch in "}]" and self.start is not None:
+                self.depth -= 1
+                if self.depth == 0:
+                    spans.append((self.start, i + 1))
+                    self.start = None
+        self.offset += len(text)
+        return spans
+
+# A tool call an agent expects to make: (tool name, arguments)
+ToolCallGuess = Tuple[str, Dict[str, Any]]
+
 class LlmAgent:
-    def __init__(self, name: str, model: str, description: str, instruction: str, tools: List[Callable] = None, output_schema: Type[BaseModel] = None, output_key: str = None):
+    def __init__(self, name: str, model: str, description: str, instruction: str, tools: List[Callable] = None, output_schema: Type[BaseModel] = None, output_key: str = None,
+                 predict_tool_calls: Callable[[Dict[str, Any]], List[ToolCallGuess]] = None):
         self.name = name
+        self.model = model
         self.description = description
         self.instruction = instruction
         self.tools = tools or []
         self.output_schema = output_schema
         self.output_key = output_key
+        self.predict_tool_calls = predict_tool_calls
+        self._adapter = type_adapter(output_schema) if output_schema else None
+        # Built once and reused as the first message of every call
+        self._system_msg = SystemMessage(content=self.instruction)
         
         # --- Dynamic LLM Selection ---
         self.llm = self._get_llm_client(model)
@@ -120,7 +499,9 @@ class LlmAgent:
             self.lc_tools = [tool_decorator(t) for t in self.tools]
             self.llm_with_tools = self.llm.bind_tools(self.lc_tools)
         else:
+            self.lc_tools = []
             self.llm_with_tools = self.llm
+        self._tools_by_name = {t.name: t for t in self.lc_tools}
 
     def _get_llm_client(self, requested_model: str):
         """
@@ -130,123 +511,634 @@ class LlmAgent:
         
         # 2. Gemini (Google)
         if os.getenv("GEMINI_API_KEY"):
-            print(f"  [Init] Agent '{self.name}' using Gemini.")
-            return ChatGoogleGenerativeAI(
-                model="gemini-1.5-flash",
-                google_api_key=os.getenv("GEMINI_API_KEY"),
-                temperature=0
-            )
+            logger.info("Agent %s using Gemini", self.name)
+            return get_llm(requested_model)
             
         else:
             raise RuntimeError("No valid LLM API key found (GEMINI). Check .env.")
 
     def run(self, input_data: Dict[str, Any]) -> Dict[str, Any]:
-        print(f"\n--- Running Agent: {self.name} ---")
+        """Synchronous wrapper around arun() for callers outside an event loop."""
+        return asyncio.run(self.arun(input_data))
+
+    async def arun(self, input_data: Dict[str, Any]) -> Dict[str, Any]:
+        logger.info("Running agent %s", self.name)
         
         # Construct Prompt
-        prompt_text = f"Input Data: {json.dumps(input_data, indent=2)}\n\nPlease process this input according to your instructions."
+        # Static text first, volatile input last: providers cache the longest identical
+        # prompt prefix (system instruction + tool schemas + PROMPT_PREAMBLE), and
+        # sorted keys keep the serialized input byte-stable across runs. The input is
+        # compact: indentation only costs tokens and serialization time.
+        prompt_text = f"{PROMPT_PREAMBLE}{dump_prompt_json(input_data)}"
         messages = [
-            SystemMessage(content=self.instruction),
+            self._system_msg,
             HumanMessage(content=prompt_text)
         ]
         
+        prefetched = {}
         try:
+            # Start the tool calls we can already predict, so they run during the first
+            # LLM turn instead of after it.
+            prefetched = self._prefetch_tool_calls(input_data)
+
             # Invoke LLM
-            response = self.llm_with_tools.invoke(messages)
+            response = await self._astream_reply(messages)
             
             # Handle Tool Calls (Simple Loop)
             # Note: In a full LangGraph, this would be a node loop. 
             # Here we do a simple local loop for the agent's turn.
             if response.tool_calls:
-                print(f"  [Tool Call] {len(response.tool_calls)} tool(s) called.")
+                logger.info("%s called %d tool(s)", self.name, len(response.tool_calls))
                 messages.append(response) # Add AI message with tool calls
                 
-                for tool_call in response.tool_calls:
-                    tool_name = tool_call["name"]
-                    tool_args = tool_call["args"]
-                    
-                    # Find the matching tool function
-                    selected_tool = next((t for t in self.lc_tools if t.name == tool_name), None)
-                    
-                    if selected_tool:
-                        print(f"  [Executing] {tool_name} with {tool_args}")
-                        tool_output = selected_tool.invoke(tool_args)
-                        messages.append(ToolMessage(tool_call_id=tool_call["id"], content=str(tool_output)))
-                    else:
-                        print(f"  [Error] Tool {tool_name} not found.")
-                        messages.append(ToolMessage(tool_call_id=tool_call["id"], content="Error: Tool not found"))
+                # Tool calls in one turn are independent (different queries/URLs), so run them
+                # concurrently; results come back in call order.
+                outputs = await asyncio.gather(
+                    *(self._run_tool_call(tool_call, prefetched) for tool_call in response.tool_calls),
+                    return_exceptions=True
+                )
+                for tool_call, tool_output in zip(response.tool_calls, outputs):
+                    if isinstance(tool_output, Exception):
+                        logger.warning("Tool %s failed: %s", tool_call["name"], tool_output)
+                        tool_output = f"Error: {tool_output}"
+                    messages.append(ToolMessage(tool_call_id=tool_call["id"], content=str(tool_output)))
                 
                 # Get final response after tools
-                final_response = self.llm_with_tools.invoke(messages)
-                output_text = final_response.content
+                final_response = await self._astream_reply(messages)
+                output_text = final_response.text
             else:
-                output_text = response.content
+                output_text = response.text
 
             # Parse Output
             if self.output_schema:
                 try:
-                    # Clean markdown code blocks if present
-                    cleaned_text = str(output_text).replace("```json", "").replace("```", "").strip()
-                    json_data = json.loads(cleaned_text)
-                    validated_data = self.output_schema(**json_data)
+                    validated_data = self._validate_output(output_text)
                     if self.output_key:
                         return {self.output_key: validated_data.model_dump()}
                     return validated_data.model_dump()
                 except Exception as e:
-                    print(f"  [Error] JSON Validation failed: {e}")
+                    logger.warning("%s output failed JSON validation: %s", self.name, e)
                     return {"error": "Failed to parse JSON", "raw_output": output_text}
             else:
                 if self.output_key:
                     return {self.output_key: output_text}
                 return {"output": output_text}
 
+        except TRANSIENT_ERRORS:
+            # Let run_with_retries back off and try again
+            raise
         except Exception as e:
-            print(f"  [Error] Agent execution failed: {e}")
-            traceback.print_exc()
+            logger.exception("Agent %s failed: %s", self.name, e)
             return {"error": str(e)}
+        finally:
+            # Unused predictions: the tools' own runs are shielded and still fill their caches
+            for task in prefetched.values():
+                task.cancel()
+
+    def _prefetch_tool_calls(self, input_data: Dict[str, Any]) -> Dict[str, asyncio.Task]:
+        """
+        Launches the predicted tool calls as background tasks, keyed by tool name + args.
+        A call that differs only cosmetically (e.g. a trailing slash) misses this map but
+        is coalesced with the prefetch by the tool's own cache key.
+        """
+        if not self.predict_tool_calls:
+            return {}
+        prefetched = {}
+        for tool_name, tool_args in self.predict_tool_calls(input_data):
+            selected_tool = self._tools_by_name.get(tool_name)
+            if selected_tool is not None:
+                logger.info("Prefetching %s with %s", tool_name, tool_args)
+                prefetched[hash_key({"name": tool_name, "args": tool_args})] = asyncio.create_task(selected_tool.ainvoke(tool_args))
+        return prefetched
+
+    async def _run_tool_call(self, tool_call: Dict[str, Any], prefetched: Dict[str, asyncio.Task] = None) -> Any:
+        tool_name = tool_call["name"]
+        tool_args = tool_call["args"]
+
+        task = (prefetched or {}).pop(hash_key({"name": tool_name, "args": tool_args}), None)
+        if task is not None:
+            logger.info("Executing %s with %s (prefetched)", tool_name, tool_args)
+            return await task
+
+        # Find the matching tool function
+        selected_tool = self._tools_by_name.get(tool_name)
+        if selected_tool is None:
+            logger.warning("Tool %s not found", tool_name)
+            return "Error: Tool not found"
+
+        logger.info("Executing %s with %s", tool_name, tool_args)
+        return await selected_tool.ainvoke(tool_args)
+
+    def _validate_output(self, text: str) -> BaseModel:
+        """
+        Parses and validates a schema reply in one pass with the precompiled adapter.
+        Tries the outermost JSON object first, dropping markdown fences or prose around it;
+        if that fails, tries each top-level object in turn, in case prose braces precede it.
+        """
+        try:
+            return self._adapter.validate_json(extract_json(text))
+        except ValueError:
+            for start, end in JsonEndScanner().feed(text):
+                if (validated := self._try_validate(text[start:end])) is not None:
+                    return validated
+            raise
+
+    def _try_validate(self, candidate: str) -> Optional[BaseModel]:
+        try:
+            return self._adapter.validate_json(candidate)
+        except ValueError:
+            return None
+
+    async def _astream_reply(self, messages: List[Any]) -> AIMessageChunk:
+        """
+        Streams one model reply into a single message. For schema agents, stops reading
+        as soon as a complete JSON object validates against the schema instead of waiting
+        for trailing commentary; objects that don't validate (e.g. "{result}" in prose)
+        are skipped and the stream is read on.
+        """
+        scanner = JsonEndScanner() if self.output_schema else None
+        scanned = ""
+        reply = None
+        # aclosing shuts the stream (and its HTTP response) down when we break early
+        async with contextlib.aclosing(self.llm_with_tools.astream(messages)) as stream:
+            async for chunk in stream:
+                reply = chunk if reply is None else reply + chunk
+                calling_tools = reply.tool_calls or getattr(reply, "tool_call_chunks", None)
+                if scanner and not calling_tools:
+                    scanned += chunk.text
+                    if any(self._try_validate(scanned[start:end]) is not None for start, end in scanner.feed(chunk.text)):
+                        break
+        return reply if reply is not None else AIMessageChunk(content="")
+
+
+# --- 2b. LLM Response Cache ---
+
+LLM_CACHE_DIR = os.path.join(os.path.dirname(__file__), "memory", "llm_cache")
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("LLM_CACHE_SIMILARITY", "0.92"))
+# Cached outputs older than this (seconds) are ignored and pruned.
+LLM_CACHE_TTL = float(os.getenv("LLM_CACHE_TTL", str(24 * 3600)))
+EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+# ONNX export of EMBEDDING_MODEL (see README); quantized to INT8 on first use.
+EMBEDDING_ONNX_DIR = os.getenv("EMBEDDING_ONNX_DIR", os.path.join(LLM_CACHE_DIR, "minilm-onnx"))
+
+# Semantic lookups are optional: with neither onnxruntime nor sentence-transformers
+# installed, the cache is exact-match only. Only their presence is checked here; the
+# packages themselves (sentence-transformers pulls in torch) load with the first embedder.
+HAS_ONNXRUNTIME = find_spec("onnxruntime") is not None and find_spec("tokenizers") is not None
+HAS_SENTENCE_TRANSFORMERS = find_spec("sentence_transformers") is not None
+
+
+class OnnxEmbedder:
+    """
+    Mean-pooled, normalized MiniLM embeddings from an INT8 ONNX Runtime session.
+    Encodes a whole batch in a single session.run call.
+    """
+    def __init__(self, model_dir: str):
+        import onnxruntime
+        from tokenizers import Tokenizer
+
+        quantized = os.path.join(model_dir, "model_quantized.onnx")
+        if not os.path.exists(quantized):
+            from onnxruntime.quantization import quantize_dynamic, QuantType
+            quantize_dynamic(os.path.join(model_dir, "model.onnx"), quantized, weight_type=QuantType.QInt8)
+        self.session = onnxruntime.InferenceSession(quantized, providers=["CPUExecutionProvider"])
+        self.input_names = {i.name for i in self.session.get_inputs()}
+        self.tokenizer = Tokenizer.from_file(os.path.join(model_dir, "tokenizer.json"))
+        self.tokenizer.enable_padding()
+        self.tokenizer.enable_truncation(max_length=256)
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        encodings = self.tokenizer.encode_batch(texts)
+        feeds = {
+            "input_ids": np.array([e.ids for e in encodings], dtype=np.int64),
+            "attention_mask": np.array([e.attention_mask for e in encodings], dtype=np.int64),
+            "token_type_ids": np.array([e.type_ids for e in encodings], dtype=np.int64),
+        }
+        hidden = self.session.run(None, {k: v for k, v in feeds.items() if k in self.input_names})[0]
+        mask = feeds["attention_mask"][..., None].astype(np.float32)
+        pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        return (pooled / np.linalg.norm(pooled, axis=1, keepdims=True)).astype(np.float32)
+
+
+class SentenceTransformerEmbedder:
+    def __init__(self, model_name: str):
+        from sentence_transformers import SentenceTransformer
+
+        self.model = SentenceTransformer(model_name)
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        return self.model.encode(texts, normalize_embeddings=True, batch_size=64).astype(np.float32)
+
+
+_embedder = None
+_embedder_lock = threading.Lock()
+
+def get_embedder():
+    """Loads the fastest available embedder once: ONNX INT8 first, then sentence-transformers."""
+    global _embedder
+    with _embedder_lock:
+        if _embedder is None:
+            if HAS_ONNXRUNTIME and os.path.exists(os.path.join(EMBEDDING_ONNX_DIR, "tokenizer.json")):
+                _embedder = OnnxEmbedder(EMBEDDING_ONNX_DIR)
+            elif HAS_SENTENCE_TRANSFORMERS:
+                _embedder = SentenceTransformerEmbedder(EMBEDDING_MODEL)
+    return _embedder
+
+def embed_texts(texts: List[str]) -> Optional[np.ndarray]:
+    """Returns an [N, D] matrix of normalized float32 embeddings, or None if no embedder is available."""
+    embedder = get_embedder()
+    if embedder is None:
+        return None
+    return embedder.encode(texts)
+
+def embed_text(text: str) -> Optional[np.ndarray]:
+    """Returns a normalized float32 embedding, or None if no embedding model is available."""
+    vectors = embed_texts([text])
+    return None if vectors is None else vectors[0]
+
+# Phrases at least this similar are treated as the same question/theme.
+DEDUP_SIMILARITY = float(os.getenv("DEDUP_SIMILARITY", "0.85"))
+
+def dedupe_texts(texts: List[str], threshold: float = DEDUP_SIMILARITY) -> List[str]:
+    """
+    Drops near-duplicate phrases, keeping the first occurrence of each.
+    All texts are embedded in one batch and compared through a single [N, N]
+    similarity matrix; without an embedder, falls back to case-insensitive exact matching.
+    """
+    texts = list(dict.fromkeys(t.strip() for t in texts if t and t.strip()))
+    vectors = embed_texts(texts) if len(texts) > 1 else None
+    if vectors is None:
+        seen = set()
+        return [t for t in texts if not (t.casefold() in seen or seen.add(t.casefold()))]
+    # A text is a duplicate if any earlier text is close enough to it.
+    similarity = np.triu(vectors @ vectors.T, k=1)
+    keep = similarity.max(axis=0) < threshold
+    return [t for t, k in zip(texts, keep) if k]
+
+
+class LlmResponseCache:
+    """
+    SQLite store of agent outputs, keyed by an exact input hash.
+    Rows of semantic agents also keep the embedded text and its vector. Per namespace,
+    the vectors are held in one contiguous [N, D] matrix so a lookup is a single
+    matrix-vector product. Rows older than `ttl` seconds are never returned and are
+    pruned on open and then at most once per `ttl` as new rows are written.
+    """
+    def __init__(self, cache_dir: str = LLM_CACHE_DIR, ttl: float = LLM_CACHE_TTL):
+        os.makedirs(cache_dir, exist_ok=True)
+        self.path = os.path.join(cache_dir, "responses.sqlite3")
+        self.ttl = ttl
+        self._indexes: Dict[str, Any] = {}  # namespace -> (keys, matrix, created)
+        self._lock = threading.Lock()
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, namespace TEXT, input TEXT, semantic_text TEXT, "
+                "output BLOB, embedding BLOB, created REAL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_namespace ON responses (namespace)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_created ON responses (created)")
+        self.prune()
+
+    def _connect(self):
+        # One short-lived connection per call keeps the cache safe across worker threads.
+        return sqlite3.connect(self.path, timeout=30)
+
+    def _cutoff(self) -> float:
+        return time.time() - self.ttl
+
+    def prune(self):
+        """Deletes expired rows and drops the in-memory indexes that may still reference them."""
+        with self._connect() as conn:
+            conn.execute("DELETE FROM responses WHERE created <= ?", (self._cutoff(),))
+        with self._lock:
+            self._indexes.clear()
+            self._last_prune = time.time()
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT output FROM responses WHERE key = ? AND created > ?", (key, self._cutoff())
+            ).fetchone()
+        return row[0] if row else None
+
+    def _index(self, namespace: str):
+        """
+        Loads the namespace's vectors into memory on first use. Rows stored while no
+        embedder was available are encoded here in one batch and written back.
+        """
+        if namespace in self._indexes:
+            return self._indexes[namespace]
+
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT key, semantic_text, embedding, created FROM responses "
+                "WHERE namespace = ? AND semantic_text IS NOT NULL AND created > ?",
+                (namespace, self._cutoff())
+            ).fetchall()
+
+        stale = [i for i, (_, _, blob, _) in enumerate(rows) if blob is None]
+        fresh = embed_texts([rows[i][1] for i in stale]) if stale else None
+        if fresh is not None:
+            with self._connect() as conn:
+                conn.executemany(
+                    "UPDATE responses SET embedding = ? WHERE key = ?",
+                    [(fresh[n].tobytes(), rows[i][0]) for n, i in enumerate(stale)]
+                )
+            blobs = {i: fresh[n].tobytes() for n, i in enumerate(stale)}
+            rows = [(k, t, blobs.get(i, b), c) for i, (k, t, b, c) in enumerate(rows)]
+
+        rows = [r for r in rows if r[2] is not None]
+        keys = [k for k, _, _, _ in rows]
+        matrix = np.frombuffer(b"".join(b for _, _, b, _ in rows), dtype=np.float32).reshape(len(rows), -1) if rows else None
+        created = np.array([c for _, _, _, c in rows], dtype=np.float64)
+        self._indexes[namespace] = (keys, matrix, created)
+        return keys, matrix, created
+
+    def nearest(self, namespace: str, embedding: np.ndarray, threshold: float) -> Optional[bytes]:
+        with self._lock:
+            keys, matrix, created = self._index(namespace)
+        if matrix is None:
+            return None
+        # Rows that expired since the index was loaded can never win.
+        scores = np.where(created > self._cutoff(), matrix @ embedding, -np.inf)
+        best = int(np.argmax(scores))
+        return self.get(keys[best]) if scores[best] >= threshold else None
+
+    def put(self, key: str, namespace: str, input_text: str, output: bytes,
+            semantic_text: Optional[str] = None, embedding: Optional[np.ndarray] = None):
+        if time.time() - self._last_prune > self.ttl:
+            self.prune()
+        blob = embedding.tobytes() if embedding is not None else None
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, namespace, input_text, semantic_text, output, blob, now)
+            )
+        with self._lock:
+            if embedding is not None and namespace in self._indexes:
+                keys, matrix, created = self._indexes[namespace]
+                row = embedding[None, :]
+                self._indexes[namespace] = (
+                    keys + [key],
+                    row if matrix is None else np.vstack([matrix, row]),
+                    np.append(created, now),
+                )
+
+
+class CachedLlmAgent(LlmAgent):
+    """
+    LlmAgent that memoizes successful outputs in an LlmResponseCache.
+
+    Exact repeats (same model, instruction and input) always hit. If `semantic_key` names an
+    input field (e.g. "keyword"), a miss falls back to the most similar cached value of that
+    field, provided its cosine similarity is at least SEMANTIC_CACHE_THRESHOLD and every other
+    input field is identical. Leave it unset for agents whose output must not be shared between
+    similar inputs (e.g. different URLs).
+    """
+    def __init__(self, *args, semantic_key: str = None, cache: LlmResponseCache = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.semantic_key = semantic_key
+        self.cache = cache or LlmResponseCache()
+        # Output is only reusable for the same model + instructions.
+        self.namespace = hash_key({"model": self.model, "instruction": self.instruction})
+
+    def cache_key(self, input_data: Dict[str, Any]) -> str:
+        return hash_key({"model": self.model, "instruction": self.instruction, "input": input_data})
+
+    def semantic_namespace(self, input_data: Dict[str, Any]) -> str:
+        """Scopes similarity lookups to inputs that differ only in the semantic field."""
+        context = {k: v for k, v in input_data.items() if k != self.semantic_key}
+        return hash_key({"namespace": self.namespace, "context": context})
+
+    def _dump_output(self, result: Dict[str, Any]) -> bytes:
+        """Serializes the agent's output value (without the output_key wrapper) for storage."""
+        return orjson.dumps(result[self.output_key] if self.output_key else result)
+
+    def _load_cached(self, output: bytes) -> Optional[Dict[str, Any]]:
+        """
+        Decodes a stored output. Schema outputs go straight from JSON bytes through
+        the precompiled adapter (no intermediate dict) and are dumped once at the boundary.
+        """
+        try:
+            if self.output_schema:
+                value = self._adapter.validate_json(output).model_dump()
+            else:
+                value = orjson.loads(output)
+            return {self.output_key: value} if self.output_key else value
+        except Exception as e:
+            logger.warning("Discarding invalid cache entry for %s: %s", self.name, e)
+            return None
+
+    async def arun(self, input_data: Dict[str, Any]) -> Dict[str, Any]:
+        key = self.cache_key(input_data)
+        cached = self.cache.get(key)
+        if cached is not None and (result := self._load_cached(cached)) is not None:
+            logger.info("Exact cache hit for %s", self.name)
+            return result
+
+        namespace, semantic_text, embedding = self.namespace, None, None
+        if self.semantic_key and self.semantic_key in input_data:
+            namespace = self.semantic_namespace(input_data)
+            semantic_text = orjson.dumps(input_data[self.semantic_key], option=orjson.OPT_SORT_KEYS).decode()
+            # Embedding is CPU-bound; keep it off the event loop.
+            embedding = await asyncio.to_thread(embed_text, semantic_text)
+            if embedding is not None:
+                # The first lookup per namespace may batch-encode stored rows.
+                cached = await asyncio.to_thread(self.cache.nearest, namespace, embedding, SEMANTIC_CACHE_THRESHOLD)
+                if cached is not None and (result := self._load_cached(cached)) is not None:
+                    logger.info("Semantic cache hit for %s", self.name)
+                    return result
+
+        result = await super().arun(input_data)
+        if "error" not in result:
+            self.cache.put(key, namespace, orjson.dumps(input_data, option=orjson.OPT_SORT_KEYS).decode(), self._dump_output(result), semantic_text, embedding)
+        return result
 
 
 # --- 3. Resilience & Memory Helpers ---
 
-def run_with_retries(func, *args, **kwargs):
+class _DeferredQueueHandler(logging.handlers.QueueHandler):
+    """Enqueues records untouched, so even traceback formatting happens on the listener thread."""
+    def prepare(self, record):
+        return record
+
+def configure_logging(level: str = "WARNING"):
     """
-    Executes a function with exponential backoff retries.
+    Sets up root logging so callers (including the event loop) only enqueue records;
+    a listener thread formats them and writes to stderr. Safe to call more than once.
     """
-    @retry(
+    root = logging.getLogger()
+    root.setLevel(level)
+    if any(isinstance(h, _DeferredQueueHandler) for h in root.handlers):
+        return
+    log_queue = queue.SimpleQueue()
+    stream_handler = logging.StreamHandler()
+    stream_handler.setFormatter(logging.Formatter(logging.BASIC_FORMAT))
+    listener = logging.handlers.QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    root.addHandler(_DeferredQueueHandler(log_queue))
+    listener.start()
+    atexit.register(listener.stop)
+
+# Failures worth another attempt: rate limits, 5xx responses (Gemini's ServerError is
+# re-raised as ModelAPIError), dropped connections and timeouts. Anything else (bad JSON,
+# validation errors, auth) fails the same way on retry.
+TRANSIENT_ERRORS = (
+    ModelRateLimitError,
+    ModelAPIError,
+    ModelConnectionError,
+    ModelTimeoutError,
+    aiohttp.ClientError,
+    httpx.TransportError,
+    TimeoutError,
+)
+
+def _log_retry(retry_state):
+    logger.warning(
+        "%s attempt %d failed: %r; retrying in %.1fs",
+        retry_state.fn.__qualname__, retry_state.attempt_number,
+        retry_state.outcome.exception(), retry_state.next_action.sleep
+    )
+
+def _retrying(func):
+    return retry(
         stop=stop_after_attempt(3),
         wait=wait_exponential(multiplier=1, min=4, max=10),
-        retry=retry_if_exception_type(Exception),
+        retry=retry_if_exception_type(TRANSIENT_ERRORS),
+        before_sleep=_log_retry,
         reraise=True
-    )
+    )(func)
+
+def run_with_retries(func, *args, **kwargs):
+    """
+    Executes a function, retrying transient failures with exponential backoff.
+    """
+    @_retrying
+    @functools.wraps(func)
     def wrapper():
         return func(*args, **kwargs)
     
     try:
         return wrapper()
     except Exception as e:
-        print(f"  [Retry Failed] Function {func.__name__} failed after retries: {e}")
+        logger.error("%s failed: %s", func.__name__, e)
+        raise e
+
+async def run_with_retries_async(func, *args, **kwargs):
+    """
+    Awaits a coroutine function, retrying transient failures with exponential backoff.
+    """
+    @_retrying
+    @functools.wraps(func)
+    async def wrapper():
+        return await func(*args, **kwargs)
+    
+    try:
+        return await wrapper()
+    except Exception as e:
+        logger.error("%s failed: %s", func.__name__, e)
         raise e
 
 MEMORY_FILE = os.path.join(os.path.dirname(__file__), "memory", "state.json")
+# Append-only log of state updates made since the MEMORY_FILE snapshot was written.
+MEMORY_LOG_FILE = os.path.join(os.path.dirname(__file__), "memory", "state.jsonl")
+# Compact once the log outgrows the snapshot by this factor (and is past the floor).
+MEMORY_COMPACT_RATIO = 4
+MEMORY_COMPACT_MIN_BYTES = 64 * 1024
+
+# Above this size the state file is memory-mapped rather than read into a copy.
+MEMORY_MMAP_THRESHOLD = 1 << 20  # bytes
+
+_memory_lock = threading.RLock()
+_compacting = threading.Event()
+
+def _read_json_file(path: str) -> Dict[str, Any]:
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size < MEMORY_MMAP_THRESHOLD:
+            return orjson.loads(f.read())
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf, memoryview(buf) as view:
+            return orjson.loads(view)
 
 def load_memory() -> Dict[str, Any]:
-    """Loads persistent state from JSON file."""
-    if os.path.exists(MEMORY_FILE):
+    """Loads the persistent state: the JSON snapshot with the update log replayed over it."""
+    state = {}
+    with _memory_lock:
         try:
-            with open(MEMORY_FILE, "r") as f:
-                return json.load(f)
+            if os.path.exists(MEMORY_FILE):
+                state = _read_json_file(MEMORY_FILE)
+            if os.path.exists(MEMORY_LOG_FILE):
+                with open(MEMORY_LOG_FILE, "rb") as f:
+                    for line in f:
+                        try:
+                            entry = orjson.loads(line)
+                        except orjson.JSONDecodeError:
+                            # A crash mid-append can leave a partial last line
+                            continue
+                        if entry.get("reset"):
+                            # A new run started; nothing before it belongs to the current state
+                            state = {}
+                        else:
+                            state[entry["k"]] = entry["v"]
         except Exception as e:
-            print(f"  [Memory] Failed to load memory: {e}")
-    return {}
+            logger.error("Failed to load memory: %s", e)
+    return state
 
 def save_memory(state: Dict[str, Any]):
-    """Saves state to JSON file."""
+    """
+    Saves state to JSON file, replacing the snapshot and clearing the update log.
+    Writes a temp file and renames it over MEMORY_FILE, so an interrupted save
+    never leaves a truncated state behind.
+    """
     try:
         os.makedirs(os.path.dirname(MEMORY_FILE), exist_ok=True)
-        with open(MEMORY_FILE, "w") as f:
-            json.dump(state, f, indent=2)
+        data = orjson.dumps(state, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY)
+        tmp_path = MEMORY_FILE + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        with _memory_lock:
+            os.replace(tmp_path, MEMORY_FILE)
+            if os.path.exists(MEMORY_LOG_FILE):
+                os.remove(MEMORY_LOG_FILE)
+    except Exception as e:
+        logger.error("Failed to save memory: %s", e)
+
+def append_memory(key: str, value: Any):
+    """
+    Records one state key without rewriting the whole state: a single line is
+    appended to MEMORY_LOG_FILE, and later entries win when the log is replayed.
+    """
+    _append_memory_entry({"k": key, "v": value})
+
+def start_memory_run():
+    """
+    Marks the start of a new run. load_memory discards everything recorded before
+    the marker, so keys a run never writes do not leak in from earlier runs.
+    """
+    _append_memory_entry({"reset": True})
+
+def _append_memory_entry(entry: Dict[str, Any]):
+    try:
+        os.makedirs(os.path.dirname(MEMORY_LOG_FILE), exist_ok=True)
+        line = orjson.dumps(entry, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY) + b"\n"
+        with _memory_lock:
+            with open(MEMORY_LOG_FILE, "ab") as f:
+                f.write(line)
+                log_size = f.tell()
+        snapshot_size = os.path.getsize(MEMORY_FILE) if os.path.exists(MEMORY_FILE) else 0
+        if log_size > max(MEMORY_COMPACT_MIN_BYTES, MEMORY_COMPACT_RATIO * snapshot_size) and not _compacting.is_set():
+            _compacting.set()
+            threading.Thread(target=compact_memory, name="memory-compaction", daemon=True).start()
     except Exception as e:
-        print(f"  [Memory] Failed to save memory: {e}")
+        logger.error("Failed to append memory: %s", e)
+
+def compact_memory():
+    """Folds the update log into a fresh snapshot."""
+    try:
+        with _memory_lock:
+            save_memory(load_memory())
+    finally:
+        _compacting.clear()
 
 # Export tools for agents.py
 # Note: agents.py expects these to be callables or list of callables